@@ -1,18 +1,71 @@
 import asyncio
+import contextlib
+import hashlib
+import logging
+import multiprocessing
 import os
+import shutil
+import subprocess
+import time
 import uuid
-from datetime import datetime, timedelta
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
+from typing import List, Optional, Tuple
 
-import aiofiles
+import bcrypt
 import jwt
-from fastapi import Depends, FastAPI, File, HTTPException, Request, UploadFile, status
+import orjson
+from fastapi import (
+    Depends,
+    FastAPI,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    bindparam,
+    create_engine,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from typing_extensions import TypedDict
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
@@ -22,12 +75,47 @@ UPLOAD_DIR = Path("uploads")
 PROCESSED_DIR = Path("processed")
 THUMBNAIL_DIR = Path("thumbnails")
 CHUNK_SIZE = 1024 * 1024  # 1MB chunks for streaming
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))  # minimum cost
+BCRYPT_TARGET_MS = int(os.getenv("BCRYPT_TARGET_MS", "250"))  # 0 disables tuning
+VIEW_FLUSH_INTERVAL = int(os.getenv("VIEW_FLUSH_INTERVAL", "5"))  # seconds
+USER_CACHE_TTL = 5  # seconds an authenticated user is reused without a query
+USER_CACHE_SIZE = 4096  # max cached users, same bound as the token cache
+# Process pool sizes are per server worker (uvicorn --workers)
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 1)))
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "2"))  # concurrent transcodes
+FFMPEG_TIMEOUT = int(os.getenv("FFMPEG_TIMEOUT", "3600"))  # seconds per transcode
+FFPROBE_TIMEOUT = 60  # seconds for probing, thumbnails and encoder detection
+# Hand video bytes to the front proxy: "nginx" (X-Accel-Redirect) or "apache"
+# (X-Sendfile). Empty serves them from this process.
+SENDFILE_BACKEND = os.getenv("SENDFILE_BACKEND", "")
+ACCEL_REDIRECT_PREFIX = os.getenv("ACCEL_REDIRECT_PREFIX", "/internal-uploads/")
+ACCEL_REDIRECT_PROCESSED_PREFIX = os.getenv(
+    "ACCEL_REDIRECT_PROCESSED_PREFIX", "/internal-processed/"
+)
+
+logger = logging.getLogger(__name__)
 
 # Create directories
 for directory in [UPLOAD_DIR, PROCESSED_DIR, THUMBNAIL_DIR]:
     directory.mkdir(exist_ok=True)
 
-app = FastAPI(title="Enhanced Video Streaming Server")
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. FastAPI has already run
+    jsonable_encoder on route return values, so this only speeds up the
+    final encoding; options match FastAPI's own ORJSONResponse.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
+app = FastAPI(
+    title="Enhanced Video Streaming Server", default_response_class=ORJSONResponse
+)
 
 # CORS middleware
 app.add_middleware(
@@ -42,27 +130,68 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pool processes are started lazily, by which time this process runs threads
+# (aiosqlite, asyncio.to_thread); forking then is unsafe, so start them from a
+# fork server (spawn where there is none)
+WORKER_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
 
-# Database models (simplified for example)
-from sqlalchemy import (
-    Boolean,
-    Column,
-    DateTime,
-    ForeignKey,
-    Integer,
-    String,
-    create_engine,
+# Password hashing
+# bcrypt is pure CPU work; run it in worker processes so it can't stall the loop
+password_pool = ProcessPoolExecutor(
+    max_workers=PASSWORD_WORKERS, mp_context=WORKER_MP_CONTEXT
 )
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+
+
+# Database
+def async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its asyncio driver"""
+    for prefix, async_prefix in (
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix) :]
+    return url
+
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./videos.db")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL_ASYNC = os.getenv("DATABASE_URL_ASYNC", async_database_url(DATABASE_URL))
+
+# The server process has exactly one engine/pool: the async one used by the
+# request handlers, so queries never block the event loop
+async_engine = create_async_engine(
+    DATABASE_URL_ASYNC,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Sync sessions for the video processing workers; each worker process binds
+# this to its own engine in init_video_worker
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# Database models (simplified for example)
 Base = declarative_base()
 
+# Timestamps are filled in by the database. The default is also sent with each
+# insert so tables created before server_default existed still get a value.
+# SQLite's CURRENT_TIMESTAMP has no fractional seconds, so bind datetimes the
+# same way there or keyset comparisons against stored values would be off.
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(
+        storage_format=(
+            "%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+        )
+    ),
+    "sqlite",
+)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -70,7 +199,7 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(Timestamp, default=func.now(), server_default=func.now())
     videos = relationship("Video", back_populates="owner")
 
 
@@ -88,92 +217,527 @@ class Video(Base):
     processing_status = Column(
         String, default="pending"
     )  # pending, processing, completed, failed
-    upload_date = Column(DateTime, default=datetime.utcnow)
+    upload_date = Column(Timestamp, default=func.now(), server_default=func.now())
     views = Column(Integer, default=0)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the upload
     user_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="videos")
 
+    __table_args__ = (
+        # Serves the per-user, newest-first listing in list_videos
+        Index("ix_videos_user_date", "user_id", "upload_date", "id"),
+        # Rejects a user uploading the same file twice
+        Index("ux_videos_user_content_hash", "user_id", "content_hash", unique=True),
+    )
+
+
+# Response shapes for list_videos. The adapter is built once at import so
+# each request only runs the serializer.
+class VideoOut(TypedDict):
+    id: int
+    title: str
+    description: Optional[str]
+    filename: str
+    duration: Optional[int]
+    views: int
+    upload_date: datetime
+    processed: bool
+    processing_status: str
+
+
+class VideoCursor(TypedDict):
+    after: datetime
+    after_id: int
+
+
+class VideoPage(TypedDict):
+    videos: List[VideoOut]
+    next_cursor: Optional[VideoCursor]
 
-Base.metadata.create_all(bind=engine)
+
+VideoPageAdapter = TypeAdapter(VideoPage)
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # Authentication utilities
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+# bcrypt only looks at the first 72 bytes; truncate like passlib did so
+# existing $2b$ hashes keep verifying
+def _bcrypt_secret(password: str) -> bytes:
+    return password.encode("utf-8")[:72]
+
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return bcrypt.checkpw(
+        _bcrypt_secret(plain_password), hashed_password.encode("utf-8")
+    )
+
+
+def get_password_hash(password, rounds=BCRYPT_ROUNDS):
+    salt = bcrypt.gensalt(rounds=rounds, prefix=b"2b")
+    return bcrypt.hashpw(_bcrypt_secret(password), salt).decode("utf-8")
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def calibrate_bcrypt_rounds(min_rounds: int, target_ms: int) -> int:
+    """Return the highest cost >= min_rounds that hashes within target_ms"""
+    rounds = min_rounds
+    while rounds < 31:
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", bcrypt.gensalt(rounds=rounds))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # Each extra round doubles the work
+        if elapsed_ms * 2 > target_ms:
+            break
+        rounds += 1
+    return rounds
 
 
-async def get_current_user(token: str, db: Session = Depends(get_db)):
+@lru_cache(maxsize=4096)
+def decode_token(token: str):
+    """Verify a token's signature once and return its (username, exp)"""
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    return payload.get("sub"), payload.get("exp")
+
+
+# username -> (expires_at, detached User), least recently used first
+_user_cache = {}
+
+
+async def get_current_user(token: str, db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
+        username, exp = decode_token(token)
     except jwt.PyJWTError:
         raise credentials_exception
+    # Cached decodes skip jwt's own expiry check, so repeat it here
+    now = time.time()
+    if username is None or exp is None or exp <= now:
+        raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
+    cached = _user_cache.pop(username, None)
+    if cached and cached[0] > now:
+        _user_cache[username] = cached
+        return cached[1]
+
+    user = await db.scalar(select(User).where(User.username == username))
     if user is None:
         raise credentials_exception
+    # Detach so the cached instance never expires with another request's session
+    db.expunge(user)
+    if len(_user_cache) >= USER_CACHE_SIZE:
+        expired = [k for k, (expires_at, _) in _user_cache.items() if expires_at <= now]
+        for key in expired:
+            del _user_cache[key]
+        if len(_user_cache) >= USER_CACHE_SIZE:
+            # Still full of live entries: drop the least recently used one
+            del _user_cache[next(iter(_user_cache))]
+    _user_cache[username] = (now + USER_CACHE_TTL, user)
     return user
 
 
-# Video processing utilities (placeholder - would use FFmpeg in production)
-async def process_video(video_path: Path, video_id: int, db: Session):
+# View counting: streams only bump an in-process counter, which is flushed
+# to the database in one batched UPDATE every VIEW_FLUSH_INTERVAL seconds
+pending_views: Counter = Counter()
+pending_views_lock = asyncio.Lock()
+view_flush_task = None
+
+
+async def record_view(video_id: int):
+    async with pending_views_lock:
+        pending_views[video_id] += 1
+
+
+async def write_view_counts(counts: dict):
+    videos = Video.__table__
+    stmt = (
+        update(videos)
+        .where(videos.c.id == bindparam("video_id"))
+        .values(views=videos.c.views + bindparam("n"))
+    )
+    async with async_engine.begin() as conn:
+        await conn.execute(stmt, [{"video_id": k, "n": n} for k, n in counts.items()])
+
+
+async def flush_view_counts():
+    async with pending_views_lock:
+        if not pending_views:
+            return
+        counts = dict(pending_views)
+        pending_views.clear()
+
+    try:
+        await write_view_counts(counts)
+    except BaseException as e:
+        # Put the batch back, including when cancelled mid-write on shutdown
+        async with pending_views_lock:
+            pending_views.update(counts)
+        if not isinstance(e, Exception):
+            raise
+        logger.exception("Failed to flush view counts, will retry")
+
+
+async def flush_views_periodically():
+    while True:
+        await asyncio.sleep(VIEW_FLUSH_INTERVAL)
+        await flush_view_counts()
+
+
+# Upload utilities
+def save_upload(src, dest: Path) -> Tuple[int, str]:
     """
-    Process video: generate thumbnail, get duration, optionally transcode
-    In production, this would use FFmpeg via subprocess
+    Copy an uploaded file to dest in a single pass, returning its size in
+    bytes and SHA-256 hex digest. Blocking - run it in a worker thread.
     """
-    try:
-        video = db.query(Video).filter(Video.id == video_id).first()
-        if not video:
-            return
+    src.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    with open(dest, "wb") as out:
+        while chunk := src.read(CHUNK_SIZE):
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+# Video processing utilities. FFmpeg runs in a separate worker process so
+# transcoding never competes with the event loop serving streams.
+def init_video_worker(database_url: str):
+    # One transcode at a time per worker, so one connection is enough
+    engine = create_engine(
+        database_url, pool_size=1, max_overflow=0, pool_pre_ping=True
+    )
+    SessionLocal.configure(bind=engine)
 
-        video.processing_status = "processing"
-        db.commit()
 
-        # Simulate processing delay
-        await asyncio.sleep(2)
+def processed_path(filename: str) -> Path:
+    """Where the web-friendly transcode of an upload is stored"""
+    return PROCESSED_DIR / f"{filename}.mp4"
+
+
+def thumbnail_path_for(filename: str) -> Path:
+    return THUMBNAIL_DIR / f"{filename}.jpg"
+
+
+@lru_cache(maxsize=None)
+def h264_encoder_args():
+    """Use NVENC when an NVIDIA GPU and an NVENC-enabled ffmpeg are present"""
+    if shutil.which("nvidia-smi"):
+        encoders = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"],
+            capture_output=True,
+            text=True,
+            timeout=FFPROBE_TIMEOUT,
+        ).stdout
+        if "h264_nvenc" in encoders:
+            return ["-c:v", "h264_nvenc"]
+    return ["-c:v", "libx264", "-preset", "fast", "-crf", "23"]
+
 
-        # ffmpeg -i input.mp4 -ss 00:00:01 -vframes 1 thumbnail.jpg
-        # ffmpeg -i input.mp4 -c:v libx264 -preset fast -crf 23 output.mp4
+def process_video_sync(video_path: str, video_id: int):
+    """
+    Process video: get duration, generate thumbnail, transcode to H.264/AAC.
+    Without FFmpeg installed the upload is marked completed as-is.
+    """
+    db = SessionLocal()
+    try:
+        # Claim the job, so an upload queued twice (see requeue_pending_videos)
+        # is only processed once
+        claimed = db.execute(
+            update(Video)
+            .where(Video.id == video_id, Video.processing_status == "pending")
+            .values(processing_status="processing")
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return
+        video = db.get(Video, video_id)
+
+        if shutil.which("ffmpeg") and shutil.which("ffprobe"):
+            probe = subprocess.run(
+                [
+                    "ffprobe",
+                    "-v",
+                    "error",
+                    "-show_entries",
+                    "format=duration",
+                    "-of",
+                    "default=noprint_wrappers=1:nokey=1",
+                    video_path,
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+                timeout=FFPROBE_TIMEOUT,
+            )
+            duration = float(probe.stdout.strip())
+
+            thumbnail_path = thumbnail_path_for(video.filename)
+            subprocess.run(
+                [
+                    "ffmpeg",
+                    "-y",
+                    "-v",
+                    "error",
+                    "-ss",
+                    str(duration / 2),
+                    "-i",
+                    video_path,
+                    "-vf",
+                    "scale=320:-1",
+                    "-frames:v",
+                    "1",
+                    str(thumbnail_path),
+                ],
+                capture_output=True,
+                check=True,
+                timeout=FFPROBE_TIMEOUT,
+            )
+
+            # Transcode next to the final path and move it into place, so a
+            # half-written file is never streamed
+            output_path = processed_path(video.filename)
+            tmp_output_path = PROCESSED_DIR / f".tmp-{output_path.name}"
+            try:
+                subprocess.run(
+                    [
+                        "ffmpeg",
+                        "-y",
+                        "-v",
+                        "error",
+                        "-i",
+                        video_path,
+                        *h264_encoder_args(),
+                        "-c:a",
+                        "aac",
+                        "-movflags",
+                        "+faststart",
+                        str(tmp_output_path),
+                    ],
+                    capture_output=True,
+                    check=True,
+                    timeout=FFMPEG_TIMEOUT,
+                )
+                os.replace(tmp_output_path, output_path)
+            finally:
+                tmp_output_path.unlink(missing_ok=True)
+
+            video.duration = int(duration)
+            video.thumbnail_path = str(thumbnail_path)
 
-        video.duration = 120  # Mock duration
         video.processed = True
         video.processing_status = "completed"
-        video.thumbnail_path = f"thumbnails/{video.filename}.jpg"
         db.commit()
 
     except Exception as e:
+        db.rollback()
         video = db.query(Video).filter(Video.id == video_id).first()
         if video:
             video.processing_status = f"failed: {str(e)}"
             db.commit()
+    finally:
+        db.close()
+
+
+def new_video_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=VIDEO_WORKERS,
+        mp_context=WORKER_MP_CONTEXT,
+        initializer=init_video_worker,
+        initargs=(DATABASE_URL,),
+    )
+
+
+video_pool = new_video_pool()
+processing_tasks = set()
+
+
+async def process_video(video_path: Path, video_id: int):
+    global video_pool
+    pool = video_pool
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(pool, process_video_sync, str(video_path), video_id)
+    except Exception as e:
+        # process_video_sync records its own errors; this is the pool failing
+        # (a worker was killed, or could not start)
+        logger.exception("Processing video %d failed", video_id)
+        if isinstance(e, BrokenProcessPool) and video_pool is pool:
+            # A broken pool rejects every later job, so start a new one
+            video_pool = new_video_pool()
+            pool.shutdown(wait=False)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Video)
+                .where(Video.id == video_id)
+                .values(processing_status=f"failed: {e}")
+            )
+            await db.commit()
+
+
+def schedule_processing(video_path: Path, video_id: int):
+    task = asyncio.create_task(process_video(video_path, video_id))
+    processing_tasks.add(task)
+    task.add_done_callback(processing_tasks.discard)
+
+
+# PostgreSQL advisory lock held while the schema is created or upgraded
+SCHEMA_LOCK_KEY = 0x766964656F  # "video"
+
+
+def upgrade_schema(conn):
+    """
+    Bring tables created by earlier versions up to the current models.
+    create_all only creates missing tables, so new columns and indexes on
+    existing tables are added here. Safe to run on every startup.
+    """
+    inspector = inspect(conn)
+    video_columns = {c["name"] for c in inspector.get_columns("videos")}
+    # content_hash is the newest column, so without it the database comes from
+    # an earlier version and its existing rows need fixing up as well
+    upgrading = "content_hash" not in video_columns
+    if upgrading:
+        conn.execute(text("ALTER TABLE videos ADD COLUMN content_hash VARCHAR(64)"))
+
+    video_indexes = {i["name"] for i in inspector.get_indexes("videos")}
+    for index in Video.__table__.indexes:
+        if index.name not in video_indexes:
+            index.create(conn)
+
+    # Earlier versions created naive timestamp columns holding UTC values.
+    # now() writes timestamptz, so convert them or old and new rows would be
+    # ordered on different clocks when the server's timezone isn't UTC
+    if conn.dialect.name == "postgresql":
+        for table, column in (("videos", "upload_date"), ("users", "created_at")):
+            column_type = next(
+                c["type"] for c in inspector.get_columns(table) if c["name"] == column
+            )
+            if not column_type.timezone:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table} ALTER COLUMN {column} TYPE "
+                        f"TIMESTAMP WITH TIME ZONE USING {column} AT TIME ZONE 'UTC'"
+                    )
+                )
+
+    if not upgrading:
+        return
+
+    # Rows inserted after the Python-side default was dropped, but before the
+    # table had a server default, were left without a timestamp
+    conn.execute(
+        update(Video).where(Video.upload_date.is_(None)).values(upload_date=func.now())
+    )
+    conn.execute(
+        update(User).where(User.created_at.is_(None)).values(created_at=func.now())
+    )
+
+    # Older SQLite rows were stored with microseconds; truncate them to the
+    # current storage format so keyset pagination compares like with like
+    if conn.dialect.name == "sqlite":
+        for table, column in (("videos", "upload_date"), ("users", "created_at")):
+            conn.execute(
+                text(
+                    f"UPDATE {table} SET {column} = substr({column}, 1, 19) "
+                    f"WHERE length({column}) > 19"
+                )
+            )
+
+
+@app.on_event("startup")
+async def create_tables():
+    async with async_engine.begin() as conn:
+        # Every server worker runs this at once; lock first so only one of them
+        # creates or upgrades the schema and the rest find it done. Both locks
+        # are released when the transaction commits.
+        if conn.dialect.name == "postgresql":
+            await conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY}
+            )
+        elif conn.dialect.name == "sqlite":
+            await conn.exec_driver_sql("BEGIN IMMEDIATE")
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
+
+
+@app.on_event("startup")
+async def tune_bcrypt_rounds():
+    global BCRYPT_ROUNDS
+    # Spawn every password worker now (the pool starts them lazily) so the first
+    # logins after a deploy don't pay process start-up on top of bcrypt
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(
+        *(
+            loop.run_in_executor(password_pool, get_password_hash, "warmup", 4)
+            for _ in range(PASSWORD_WORKERS)
+        )
+    )
+
+    if BCRYPT_TARGET_MS > 0:
+        BCRYPT_ROUNDS = await loop.run_in_executor(
+            password_pool, calibrate_bcrypt_rounds, BCRYPT_ROUNDS, BCRYPT_TARGET_MS
+        )
+    logger.info("Using bcrypt cost %d", BCRYPT_ROUNDS)
+
+
+@app.on_event("startup")
+async def start_view_flusher():
+    global view_flush_task
+    view_flush_task = asyncio.create_task(flush_views_periodically())
+
+
+@app.on_event("startup")
+async def requeue_pending_videos():
+    # Jobs still queued at the last shutdown were dropped (see
+    # shutdown_video_pool) and their uploads are still pending
+    async with AsyncSessionLocal() as db:
+        pending = (
+            await db.execute(
+                select(Video.id, Video.filename).where(
+                    Video.processing_status == "pending"
+                )
+            )
+        ).all()
+    for video_id, filename in pending:
+        schedule_processing(UPLOAD_DIR / filename, video_id)
+
+
+@app.on_event("shutdown")
+async def stop_view_flusher():
+    if view_flush_task:
+        view_flush_task.cancel()
+        # Let a cancelled in-flight flush hand its batch back before the final one
+        with contextlib.suppress(asyncio.CancelledError):
+            await view_flush_task
+    await flush_view_counts()
+    await async_engine.dispose()
+
+
+@app.on_event("shutdown")
+def shutdown_password_pool():
+    password_pool.shutdown(wait=False, cancel_futures=True)
+
+
+@app.on_event("shutdown")
+def shutdown_video_pool():
+    # Queued jobs are dropped and picked up again by requeue_pending_videos on
+    # the next start; running transcodes are left to finish
+    video_pool.shutdown(wait=False, cancel_futures=True)
 
 
 # Routes
@@ -182,30 +746,58 @@ async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+def violated_constraint(error: IntegrityError) -> str:
+    """Name of the unique index (or, on SQLite, the column) an insert violated"""
+    orig = error.orig
+    # asyncpg surfaces it on the wrapped driver error, psycopg2 on .diag
+    for source in (orig.__cause__, getattr(orig, "diag", None)):
+        name = getattr(source, "constraint_name", None)
+        if name:
+            return name
+    # SQLite: "UNIQUE constraint failed: users.email"
+    return str(orig).rpartition(": ")[2]
+
+
 @app.post("/api/register")
 async def register(
-    username: str, email: str, password: str, db: Session = Depends(get_db)
+    username: str, email: str, password: str, db: AsyncSession = Depends(get_db)
 ):
-    # Check if user exists
-    if db.query(User).filter(User.username == username).first():
-        raise HTTPException(status_code=400, detail="Username already registered")
-    if db.query(User).filter(User.email == email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-
     # Create user
-    hashed_password = get_password_hash(password)
-    user = User(username=username, email=email, hashed_password=hashed_password)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    loop = asyncio.get_running_loop()
+    hashed_password = await loop.run_in_executor(
+        password_pool, get_password_hash, password, BCRYPT_ROUNDS
+    )
+    # INSERT ... RETURNING gets the new id without a follow-up SELECT
+    stmt = (
+        insert(User)
+        .values(username=username, email=email, hashed_password=hashed_password)
+        .returning(User.id)
+    )
+    # The unique constraints do the existence check; no race between
+    # checking and inserting
+    try:
+        user_id = await db.scalar(stmt)
+        await db.commit()
+    except IntegrityError as e:
+        constraint = violated_constraint(e)
+        field = (
+            "Email" if constraint in ("ix_users_email", "users.email") else "Username"
+        )
+        raise HTTPException(status_code=400, detail=f"{field} already registered")
 
-    return {"message": "User created successfully", "user_id": user.id}
+    return {"message": "User created successfully", "user_id": user_id}
 
 
 @app.post("/api/login")
-async def login(username: str, password: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def login(username: str, password: str, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.username == username))
+    if not user:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(
+        password_pool, verify_password, password, user.hashed_password
+    ):
         raise HTTPException(status_code=401, detail="Incorrect username or password")
 
     access_token = create_access_token(data={"sub": user.username})
@@ -218,10 +810,13 @@ async def upload_video(
     title: str = None,
     description: str = None,
     token: str = None,
-    db: Session = Depends(get_db),
 ):
+    # Sessions here are opened only around the queries, so a pool connection
+    # is never held while a (possibly multi-GB) upload is written to disk
+
     # Authenticate user
-    user = await get_current_user(token, db)
+    async with AsyncSessionLocal() as db:
+        user = await get_current_user(token, db)
 
     # Validate file type
     allowed_extensions = {".mp4", ".avi", ".mov", ".mkv", ".webm", ".flv"}
@@ -232,65 +827,98 @@ async def upload_video(
     # Generate unique filename
     unique_filename = f"{uuid.uuid4()}{file_ext}"
     file_path = UPLOAD_DIR / unique_filename
+    tmp_path = UPLOAD_DIR / f".tmp-{uuid.uuid4().hex}"
 
-    # Save file in chunks (memory efficient)
-    file_size = 0
-    async with aiofiles.open(file_path, "wb") as f:
-        while chunk := await file.read(CHUNK_SIZE):
-            await f.write(chunk)
-            file_size += len(chunk)
-
-    # Create database entry
-    video = Video(
-        title=title or file.filename,
-        description=description,
-        filename=unique_filename,
-        original_filename=file.filename,
-        file_size=file_size,
-        user_id=user.id,
-    )
-    db.add(video)
-    db.commit()
-    db.refresh(video)
+    try:
+        # Save file without buffering it in memory or blocking the event loop
+        file_size, content_hash = await asyncio.to_thread(
+            save_upload, file.file, tmp_path
+        )
+
+        # Create database entry (RETURNING hands back the id and the
+        # server-side upload_date in the same round trip)
+        stmt = (
+            insert(Video)
+            .values(
+                title=title or file.filename,
+                description=description,
+                filename=unique_filename,
+                original_filename=file.filename,
+                file_size=file_size,
+                content_hash=content_hash,
+                user_id=user.id,
+            )
+            .returning(Video.id, Video.upload_date)
+        )
+        async with AsyncSessionLocal() as db:
+            try:
+                video = (await db.execute(stmt)).one()
+                await db.commit()
+            except IntegrityError:
+                raise HTTPException(status_code=409, detail="Video already uploaded")
+
+        os.replace(tmp_path, file_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
     # Start background processing
-    asyncio.create_task(process_video(file_path, video.id, db))
+    schedule_processing(file_path, video.id)
 
     return {
         "message": "Video uploaded successfully",
         "video_id": video.id,
+        "upload_date": video.upload_date,
         "status": "processing",
     }
 
 
 @app.get("/api/videos")
 async def list_videos(
-    skip: int = 0, limit: int = 20, token: str = None, db: Session = Depends(get_db)
+    after: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    token: str = None,
+    db: AsyncSession = Depends(get_db),
 ):
-    user = await get_current_user(token, db)
-    videos = (
-        db.query(Video).filter(Video.user_id == user.id).offset(skip).limit(limit).all()
-    )
+    """
+    List the user's videos newest-first. Pages use keyset pagination: pass
+    the previous page's next_cursor back as after/after_id.
+    """
+    if (after is None) != (after_id is None):
+        raise HTTPException(
+            status_code=400, detail="after and after_id must be given together"
+        )
 
-    return [
-        {
-            "id": v.id,
-            "title": v.title,
-            "description": v.description,
-            "filename": v.filename,
-            "duration": v.duration,
-            "views": v.views,
-            "upload_date": v.upload_date.isoformat(),
-            "processed": v.processed,
-            "processing_status": v.processing_status,
-        }
-        for v in videos
-    ]
+    user = await get_current_user(token, db)
+    # Only fetch the columns we return (no file/thumbnail metadata, no owner)
+    stmt = select(
+        Video.id,
+        Video.title,
+        Video.description,
+        Video.filename,
+        Video.duration,
+        Video.views,
+        Video.upload_date,
+        Video.processed,
+        Video.processing_status,
+    ).where(Video.user_id == user.id)
+    if after is not None:
+        stmt = stmt.where(tuple_(Video.upload_date, Video.id) < (after, after_id))
+    stmt = stmt.order_by(Video.upload_date.desc(), Video.id.desc()).limit(limit)
+    videos = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if videos and len(videos) == limit:
+        last = videos[-1]
+        next_cursor = {"after": last.upload_date, "after_id": last.id}
+
+    page = {"videos": [v._asdict() for v in videos], "next_cursor": next_cursor}
+    return Response(VideoPageAdapter.dump_json(page), media_type="application/json")
 
 
 @app.get("/api/video/{video_id}")
-async def get_video_info(video_id: int, db: Session = Depends(get_db)):
-    video = db.query(Video).filter(Video.id == video_id).first()
+async def get_video_info(video_id: int, db: AsyncSession = Depends(get_db)):
+    video = await db.get(Video, video_id)
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
@@ -300,46 +928,99 @@ async def get_video_info(video_id: int, db: Session = Depends(get_db)):
         "description": video.description,
         "duration": video.duration,
         "views": video.views,
-        "upload_date": video.upload_date.isoformat(),
+        "upload_date": video.upload_date,
         "processed": video.processed,
     }
 
 
+def parse_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Resolve a single-range "bytes=" header to inclusive (start, end) offsets.
+    Returns None for anything else (malformed or several ranges), leaving
+    it to FileResponse, and raises 416 when the range lies outside the file.
+    """
+    unit, _, spec = range_header.partition("=")
+    first, sep, last = spec.strip().partition("-")
+    if (
+        unit.strip().lower() != "bytes"
+        or not sep
+        or not (first or last)
+        or (first and not first.isdecimal())
+        or (last and not last.isdecimal())
+    ):
+        return None
+
+    if first:
+        start = int(first)
+        end = min(int(last), file_size - 1) if last else file_size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(file_size - int(last), 0)
+        end = file_size - 1
+    if start >= file_size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"},
+        )
+    return start, end
+
+
 @app.get("/api/stream/{video_id}")
-async def stream_video(video_id: int, request: Request, db: Session = Depends(get_db)):
-    video = db.query(Video).filter(Video.id == video_id).first()
+async def stream_video(video_id: int, request: Request):
+    # Short-lived session: the connection goes back to the pool before any
+    # bytes are streamed
+    async with AsyncSessionLocal() as db:
+        video = await db.get(Video, video_id)
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
+    # Prefer the web-friendly transcode once processing has produced one
     file_path = UPLOAD_DIR / video.filename
+    accel_path = f"{ACCEL_REDIRECT_PREFIX}{video.filename}"
+    if video.processed and processed_path(video.filename).exists():
+        file_path = processed_path(video.filename)
+        accel_path = f"{ACCEL_REDIRECT_PROCESSED_PREFIX}{file_path.name}"
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Video file not found")
 
-    # Increment view count
-    video.views += 1
-    db.commit()
+    # Increment view count (batched, see flush_view_counts)
+    await record_view(video.id)
+
+    # Let the proxy serve the file (ranges included) straight from disk
+    if SENDFILE_BACKEND == "nginx":
+        return Response(
+            media_type="video/mp4",
+            headers={"X-Accel-Redirect": accel_path},
+        )
+    if SENDFILE_BACKEND == "apache":
+        return Response(
+            media_type="video/mp4", headers={"X-Sendfile": str(file_path.resolve())}
+        )
 
     # Handle range requests for seeking
     file_size = file_path.stat().st_size
     range_header = request.headers.get("range")
 
-    if range_header:
-        # Parse range header
-        byte_range = range_header.replace("bytes=", "").split("-")
-        start = int(byte_range[0]) if byte_range[0] else 0
-        end = int(byte_range[1]) if byte_range[1] else file_size - 1
+    byte_range = parse_range(range_header, file_size) if range_header else None
+
+    if byte_range:
+        start, end = byte_range
 
         async def iterfile():
-            async with aiofiles.open(file_path, mode="rb") as f:
-                await f.seek(start)
-                remaining = end - start + 1
-                while remaining > 0:
-                    chunk_size = min(CHUNK_SIZE, remaining)
-                    data = await f.read(chunk_size)
+            # pread in a worker thread: positional reads, no shared file offset
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                offset = start
+                while offset <= end:
+                    chunk_size = min(CHUNK_SIZE, end - offset + 1)
+                    data = await asyncio.to_thread(os.pread, fd, chunk_size, offset)
                     if not data:
                         break
-                    remaining -= len(data)
+                    offset += len(data)
                     yield data
+            finally:
+                os.close(fd)
 
         headers = {
             "Content-Range": f"bytes {start}-{end}/{file_size}",
@@ -349,35 +1030,34 @@ async def stream_video(video_id: int, request: Request, db: Session = Depends(ge
         }
         return StreamingResponse(iterfile(), status_code=206, headers=headers)
 
-    # Full file streaming
-    async def iterfile():
-        async with aiofiles.open(file_path, mode="rb") as f:
-            while chunk := await f.read(CHUNK_SIZE):
-                yield chunk
-
-    return StreamingResponse(
-        iterfile(), media_type="video/mp4", headers={"Content-Length": str(file_size)}
-    )
+    # Full file streaming (served with sendfile by the ASGI server when possible;
+    # Starlette also answers the range forms parse_range leaves alone)
+    return FileResponse(file_path, media_type="video/mp4")
 
 
 @app.delete("/api/video/{video_id}")
-async def delete_video(video_id: int, token: str, db: Session = Depends(get_db)):
+async def delete_video(video_id: int, token: str, db: AsyncSession = Depends(get_db)):
     user = await get_current_user(token, db)
-    video = (
-        db.query(Video).filter(Video.id == video_id, Video.user_id == user.id).first()
+    video = await db.scalar(
+        select(Video).where(Video.id == video_id, Video.user_id == user.id)
     )
 
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
-    # Delete file
-    file_path = UPLOAD_DIR / video.filename
-    if file_path.exists():
-        file_path.unlink()
+    # Delete the upload and everything processing derived from it
+    for path in (
+        UPLOAD_DIR / video.filename,
+        processed_path(video.filename),
+        thumbnail_path_for(video.filename),
+    ):
+        path.unlink(missing_ok=True)
+    if video.thumbnail_path:
+        Path(video.thumbnail_path).unlink(missing_ok=True)
 
     # Delete from database
-    db.delete(video)
-    db.commit()
+    await db.delete(video)
+    await db.commit()
 
     return {"message": "Video deleted successfully"}
 